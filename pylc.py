@@ -9,8 +9,12 @@ Note that this code follows pep8 very loosely...
 """
 
 import os
+import json
+import queue
+import atexit
 import logging
 import subprocess
+import logging.handlers
 
 import lxc
 import yaml
@@ -18,6 +22,99 @@ import psutil
 from lockfile import LockFile
 
 
+LOG_FORMAT = '%(asctime)s - %(container)s:%(display)s %(name)s %(levelname)s - %(message)s'
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+
+class ContextFilter(logging.Filter):
+    """Stamp every record with container name and display number from config."""
+    def __init__(self, CFG):
+        super().__init__()
+        self.CFG = CFG
+
+    def filter(self, record):
+        container = getattr(self.CFG, 'container', None)
+        display = getattr(self.CFG, 'display', None)
+        record.container = '-' if container is None else container
+        record.display = '-' if display is None else display
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, so multi-line messages and tracebacks stay
+    inside their record and logs of several displays can be merged safely.
+    """
+    def format(self, record):
+        entry = {'ts': '{0},{1:03d}'.format(self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+                                            int(record.msecs)),
+                 'container': record.container,
+                 'display': record.display,
+                 'name': record.name,
+                 'level': record.levelname,
+                 'msg': record.getMessage(),
+                 'exc': None}
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ThreadQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for an in-process queue: the message is rendered right away,
+    as arguments (state file dicts, Config) are often mutated just after being
+    logged; only traceback formatting is left to the listener.
+    """
+    def prepare(self, record):
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def setup_logging(CFG, level=logging.INFO, filename=None):
+    """
+    Route all logging through a queue drained by a background thread.
+
+    Logging calls (also the ones made while a state file LockFile is held)
+    only run filters, render the message and enqueue the record; traceback
+    formatting and writing happen in the listener thread. With `filename`
+    records go as JSON lines to a file rotated by size (log_max_bytes and
+    log_backup_count from config), otherwise as text to stderr.
+    Returns the started listener, it is stopped (and flushed) at exit.
+    """
+    if filename is None:
+        target = logging.StreamHandler()
+        target.setFormatter(logging.Formatter(LOG_FORMAT))
+    else:
+        # Empty config values are None, 0 is valid (no rotation / no backups).
+        # int() makes bad values (e.g. '1M') fail here, not in listener thread
+        max_bytes = getattr(CFG, 'log_max_bytes', None)
+        backup_count = getattr(CFG, 'log_backup_count', None)
+        target = logging.handlers.RotatingFileHandler(
+            filename,
+            maxBytes=LOG_MAX_BYTES if max_bytes is None else int(max_bytes),
+            backupCount=LOG_BACKUP_COUNT if backup_count is None else int(backup_count))
+        target.setFormatter(JsonFormatter())
+
+    log_queue = queue.Queue(-1)
+    handler = ThreadQueueHandler(log_queue)
+    handler.addFilter(ContextFilter(CFG))
+    listener = logging.handlers.QueueListener(log_queue, target)
+
+    root = logging.getLogger()
+    for h in root.handlers[:]:
+        root.removeHandler(h)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
 
 def add_spawn_worker(aclass):
     def spawn_worker(self):
@@ -25,11 +122,17 @@ def add_spawn_worker(aclass):
                          self.CFG.container, self.CFG.display)
         ACL_COMM = [self.CFG.python3_binary_patch, self.CFG.pylc_catalog + '/pylcworker.py',
                     self.CFG.container, str(self.CFG.display) ]
-        subprocess.Popen(ACL_COMM,
-                         stdout=open('{0}/xpra-{1}.log'.format(self.CFG.log_files_catalog,
-                                                               self.CFG.container), 'a'),
-                         stderr=subprocess.STDOUT,
-                         preexec_fn=os.setpgrp)
+        if getattr(self.CFG, 'debug', False):
+            ACL_COMM.append('--debug')
+        # Worker logs on its own (see setup_logging), this file only
+        # catches what escapes it, e.g. tracebacks before logging is set up.
+        # No preexec_fn - the logging listener thread makes us multi-threaded
+        with open('{0}/xpra-{1}.log'.format(self.CFG.log_files_catalog,
+                                            self.CFG.container), 'a') as out:
+            subprocess.Popen(ACL_COMM,
+                             stdout=out,
+                             stderr=subprocess.STDOUT,
+                             start_new_session=True)
     setattr(aclass, 'spawn_worker', spawn_worker)
     return aclass
 
@@ -73,8 +176,9 @@ class InSanity(object):
 
     def __init__(self, CFG, logger=None):
         """
-        logger -- logger (default none). If none is leaved, new logger
-                  is created, pringting to stdout with DEBUG level.
+        logger -- logger (default none). If none is leaved, "InSanity"
+                  logger with DEBUG level is used, its records go through
+                  handlers set up by setup_logging.
         """
         self.CFG = CFG
         self.c = lxc.Container(self.CFG.container)
@@ -86,16 +190,6 @@ class InSanity(object):
         self.logger = logger or logging.getLogger("InSanity")
         if not logger:
             self.logger.setLevel(logging.DEBUG)
-            # create console handler
-            ch = logging.StreamHandler()
-            ch.setLevel(logging.DEBUG)
-            # create formatter and add it to the handlers
-            formatter = logging.Formatter('%(levelname)s - %(message)s')
-            ch.setFormatter(formatter)
-            # add the handlers to logger
-            self.logger.addHandler(ch)
-            # Dont propagate messages upstream in hierarchy (no double output)
-            self.logger.propagate = False
 
     def check(self):
         """
@@ -10,7 +10,7 @@ import sys
 import logging
 import argparse
 
-from pylc import Config, InSanity, StartStop, Xpra, SSXpra, AtDeTach
+from pylc import Config, InSanity, StartStop, Xpra, SSXpra, AtDeTach, setup_logging
 
 
 
@@ -112,40 +112,42 @@ def no_xpra():
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.WARNING,
-                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
     parser = CliParser(prog='pylc',
                        description="pylc - provides low friction LXC-Xpra-GUI command launching")
     subparsers = parser.add_subparsers()
+    # Subcommand-level option, global ones would break default subparser
+    common = argparse.ArgumentParser(add_help=False)
+    # Long-only: short flags would be eaten from launch/cli trailing command
+    common.add_argument('--debug', help="Log at DEBUG level (also for spawned workers)",
+                        action='store_true')
 
-    launch = subparsers.add_parser('launch', help="Launch a command. Default action")
+    launch = subparsers.add_parser('launch', help="Launch a command. Default action", parents=[common])
     launch.set_defaults(func=launch_command)
     launch.add_argument('container', help="LXC container name")
     launch.add_argument('display', help="In-container Xpra display number", nargs='?', type=int)
     launch.add_argument('command', help="Command to be executed", nargs='*')
     launch.add_argument('--root', '-r', help="Run command as root", action='store_true')
 
-    check = subparsers.add_parser('check', help="Check container YAML file")
+    check = subparsers.add_parser('check', help="Check container YAML file", parents=[common])
     check.set_defaults(func=check_insanity)
     check.add_argument('container', help="LXC container name")
 
-    attach = subparsers.add_parser('attach', help="Attach Xpra session to container")
+    attach = subparsers.add_parser('attach', help="Attach Xpra session to container", parents=[common])
     attach.set_defaults(func=attach_xpra)
     attach.add_argument('container', help="LXC container name")
     attach.add_argument('display', help="In-container Xpra display number", type=int)
 
-    detach = subparsers.add_parser('detach', help="Detach Xpra session from container")
+    detach = subparsers.add_parser('detach', help="Detach Xpra session from container", parents=[common])
     detach.set_defaults(func=detach_xpra)
     detach.add_argument('container', help="LXC container name")
     detach.add_argument('display', help="In-container Xpra display number", type=int)
 
-    restart = subparsers.add_parser('restart', help="Restart Xpra server in container")
+    restart = subparsers.add_parser('restart', help="Restart Xpra server in container", parents=[common])
     restart.set_defaults(func=restart_xpra_server)
     restart.add_argument('container', help="LXC container name")
     restart.add_argument('display', help="In-container Xpra display number", type=int)
 
-    cli = subparsers.add_parser('cli', help="Launch a command - pure cli (no xpra)")
+    cli = subparsers.add_parser('cli', help="Launch a command - pure cli (no xpra)", parents=[common])
     cli.set_defaults(func=no_xpra)
     cli.add_argument('container', help="LXC container name")
     cli.add_argument('command', help="Command to be executed", nargs='*')
@@ -156,4 +158,5 @@ if __name__ == "__main__":
     # args are written to Config namespace, so effectively Config == args
     Config = parser.parse_args(namespace=Config)
     Config.set_derived_parameters()
+    setup_logging(Config, level=logging.DEBUG if Config.debug else logging.WARNING)
     Config.func()
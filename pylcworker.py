@@ -10,12 +10,13 @@ import os
 import time
 import logging
 import argparse
+import threading
 import subprocess
 
 import lxc
 import yaml
 from lockfile import LockFile
-from pylc import InSanity, Config
+from pylc import InSanity, Config, setup_logging
 
 
 
@@ -27,6 +28,7 @@ class ACL_Worker(Config):
         self.CONTAINER = lxc.Container(self.container)
         assert(self.CONTAINER.defined)
         self.logger = logging.getLogger("D{0}".format(self.display))
+        self.xpra_logger = logging.getLogger("D{0}.xpra".format(self.display))
         self.Sane = InSanity(Config, logger=self.logger)
         self.xpra_connect = ['xpra',
                              '--socket-dir={0}/{1}/rootfs/home/{2}/.xpra/'.format(self.containers_catalog,
@@ -38,6 +40,19 @@ class ACL_Worker(Config):
                                                                self.hostname,
                                                                self.display), ]
 
+    def _log_output(self, stream):
+        """
+        Forward lines of `stream` to xpra logger until EOF. DEBUG level, so
+        chatty Xpra doesn't rotate worker's own records out without --debug.
+        """
+        try:
+            for line in stream:
+                self.xpra_logger.debug(line.rstrip())
+        except Exception:                                                    #pylint: disable=W0703
+            self.logger.exception("Failed reading Xpra output")
+        finally:
+            stream.close()
+
     def run(self):
         self.logger.info("ACL Worker spawned for %s.", self.xpra_worker)
         self.logger.debug(Config)
@@ -86,9 +101,16 @@ class ACL_Worker(Config):
                     break
             # Still in while, but not in lock - chanege ACL's and launch Xpra:
             self.CONTAINER.attach_wait(lxc.attach_run_command, self.setfacl, env_policy=1)
-            # subprocess.call actually launches command and hangs until the command exits
-            #xpra_exit_status = subprocess.call(xpra_connect)
-            subprocess.call(self.xpra_connect)
+            # Launch Xpra and hang until it exits. Its output goes line by line
+            # into worker log from a side thread, so helpers still holding the
+            # pipe open after Xpra exits can't keep the worker waiting
+            xpra = subprocess.Popen(self.xpra_connect,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT,
+                                    encoding='utf-8', errors='replace')
+            threading.Thread(target=self._log_output, args=(xpra.stdout,),
+                             daemon=True).start()
+            xpra.wait()
             self.logger.debug("Xpra process of %s has exited", self.xpra_worker)
             time.sleep(1.5)
         # 'break' statement's above gets interpreter here
@@ -100,13 +122,16 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Pseudo-Daemon for dispathing Xpra and controlling ACL's")
     parser.add_argument('container', help="LXC container name")
     parser.add_argument('display', help="In-container Xpra display number")
+    parser.add_argument('--debug', help="Log at DEBUG level", action='store_true')
     Config = parser.parse_args(namespace=Config)
     Config.set_derived_parameters()
 
-    logging.basicConfig(level=logging.INFO,
-                        format='%(asctime)s - %(name)s %(levelname)s - %(message)s',
-                        filename='{0}/worker-{1}.log'.format(Config.log_files_catalog,
-                                                             Config.container), )
+    # One file per display - rotation is not safe with many writer processes
+    setup_logging(Config,
+                  level=logging.DEBUG if Config.debug else logging.INFO,
+                  filename='{0}/worker-{1}-{2}.log'.format(Config.log_files_catalog,
+                                                           Config.container,
+                                                           Config.display))
 
     aclw = ACL_Worker()
     aclw.run()